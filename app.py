@@ -3,21 +3,65 @@
 # <<< ADD THESE TWO LINES AT THE VERY TOP OF THE FILE >>>
 import eventlet
 eventlet.monkey_patch()
+from eventlet import tpool
+# psycopg2 blocks in C unless it is given an eventlet-aware wait callback;
+# without this every query stalls the whole hub instead of yielding.
+from psycogreen.eventlet import patch_psycopg
+patch_psycopg()
 
 # --- All other imports go below this ---
 import os
-from flask import Flask, request, jsonify, session
+import sys
+import functools
+import logging
+import queue
+import sqlite3
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timedelta
+from flask import Flask, request, jsonify, session, g, has_request_context
+from flask import json as flask_json
+from flask.helpers import get_debug_flag
 from flask_socketio import SocketIO, join_room, leave_room, emit
-from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
-import uuid
+from flask_compress import Compress
+from flask_session import Session
+from sqlalchemy import MetaData, select, insert, update, delete, bindparam, literal, union_all, event, tuple_
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import click
+import orjson
+import redis
+import secrets
+from models import db, User, Project, ProjectMember, Task, Comment, Message, Invitation
+from jsonprovider import ORJSONProvider
+from helpers import get_user_directory, invalidate_user_directory, get_project, conditional_response, make_dummy_password_hash
 
 # ... The rest of your app.py file continues here ...
 
+# --- Logging ---
+# Handlers only enqueue records; a listener thread does the actual writes, so
+# logging never blocks a request or socket handler on stdout.
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO'))
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(QueueHandler(_log_queue))
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+QueueListener(_log_queue, _log_stream_handler).start()
+
 # --- App Initialization & Config ---
 app = Flask(__name__)
-CORS(app) # Enable CORS for all routes
+app.json = ORJSONProvider(app)
+# Comma-separated origins allowed to call the API (CORS_ORIGINS); any origin when unset.
+# Browsers may cache a preflight for a day instead of repeating it before every call.
+# X-Next-Cursor is exposed so cross-origin scripts can read the pagination cursor.
+CORS_ORIGINS = [origin.strip() for origin in os.environ['CORS_ORIGINS'].split(',')] if os.environ.get('CORS_ORIGINS') else '*'
+CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS}}, max_age=86400, expose_headers=['X-Next-Cursor'])
 
 # This reads the DATABASE_URL from Render's environment variables.
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
@@ -25,127 +69,418 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a_very_long_and_super_secret_dev_key_for_local_use')
 # <<< ADD THIS BLOCK FOR DATABASE CONNECTION POOLING >>>
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    # pre_ping costs a round trip per checkout but turns a connection the server
+    # dropped into a transparent reconnect rather than a 500. Render's Postgres
+    # keeps idle connections far longer than 5 minutes, so recycle every 30.
     "pool_pre_ping": True,
-    "pool_recycle": 300,
+    "pool_recycle": 1800,
+    # Eventlet serves many concurrent greenlets per worker, so the default
+    # pool of 5 connections becomes the bottleneck. LIFO keeps the hot set
+    # of connections warm and lets idle ones age out via pool_recycle.
+    # Tune per deploy so workers x (pool_size + max_overflow) fits the database's connection limit.
+    "pool_size": int(os.environ.get('SQL_POOL_SIZE', 20)),
+    "max_overflow": int(os.environ.get('SQL_MAX_OVERFLOW', 20)),
+    # Fail fast when the pool is exhausted instead of queueing requests behind it
+    "pool_timeout": 5,
+    "pool_use_lifo": True,
+    # Room for every fixed-shape statement the API issues in the compiled SQL cache
+    "query_cache_size": 1200,
 }
+_database_url = make_url(app.config['SQLALCHEMY_DATABASE_URI']) if app.config['SQLALCHEMY_DATABASE_URI'] else None
+# libpq TCP keepalives, so a connection dropped silently by a NAT or load
+# balancer is noticed within about a minute instead of hanging a request.
+LIBPQ_KEEPALIVES = {"keepalives": 1, "keepalives_idle": 30, "keepalives_interval": 10, "keepalives_count": 5}
+# Server-side cap on any single statement, so a runaway query fails fast instead
+# of holding a pooled connection.
+STATEMENT_TIMEOUT_MS = int(os.environ.get('STATEMENT_TIMEOUT_MS', 5000))
+if _database_url and _database_url.get_backend_name() == 'postgresql':
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = {
+        **LIBPQ_KEEPALIVES,
+        "options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}",
+    }
+# Supabase's transaction pooler (PgBouncer, port 6543) already multiplexes
+# clients onto a few backends, so a second pool on our side only pins server
+# slots per worker. Hand each checkout straight through to PgBouncer instead.
+# psycopg2 never uses server-side prepared statements, which transaction mode forbids.
+# PgBouncer also rejects the libpq 'options' startup parameter, so no statement_timeout here.
+if _database_url and _database_url.port == 6543:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        "poolclass": NullPool,
+        "query_cache_size": 1200,
+        "connect_args": {"application_name": "taskgenius", **LIBPQ_KEEPALIVES},
+    }
 # <<< END OF NEW BLOCK >>>
-db = SQLAlchemy(app)
+# Local runs may point DATABASE_URL at a SQLite file. Its defaults (rollback
+# journal, fsync on every commit, foreign keys ignored) suit neither the chat
+# write load nor the ON DELETE actions the models rely on, so each new
+# connection switches them once.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA foreign_keys=ON",
+)
+if _database_url and _database_url.get_backend_name() == 'sqlite':
+    @event.listens_for(Engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            cursor = dbapi_connection.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+            cursor.close()
+# Compress JSON list responses (tasks, comments, messages) that are big enough to benefit
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_MIN_SIZE'] = 500
+# Work factor for new password hashes. Verification always uses the cost stored
+# in each hash, so changing this only affects hashes created afterwards.
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+db.init_app(app)
 bcrypt = Bcrypt(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-# --- Database Models ---
-class User(db.Model):
-    __tablename__ = 'users'
-    id = db.Column(db.Text, primary_key=True)
-    email = db.Column(db.Text, unique=True, nullable=False)
-    name = db.Column(db.Text, nullable=False)
-    password_hash = db.Column(db.Text, nullable=False)
-    role = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-
-class Project(db.Model):
-    __tablename__ = 'projects'
-    id = db.Column(db.Text, primary_key=True)
-    name = db.Column(db.Text, nullable=False)
-    description = db.Column(db.Text)
-    owner_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='RESTRICT'), nullable=False)
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.now(), onupdate=db.func.now())
-
-class ProjectMember(db.Model):
-    __tablename__ = 'project_members'
-    project_id = db.Column(db.Text, db.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
-    user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
-
-class Task(db.Model):
-    __tablename__ = 'tasks'
-    id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.Text, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
-    title = db.Column(db.Text, nullable=False)
-    description = db.Column(db.Text)
-    status = db.Column(db.Text, nullable=False, default='To Do')
-    priority = db.Column(db.Text, nullable=False, default='Medium')
-    due_date = db.Column(db.Text)
-    creator_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'))
-    assignee_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'))
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.now(), onupdate=db.func.now())
-
-class Comment(db.Model):
-    __tablename__ = 'comments'
-    id = db.Column(db.Integer, primary_key=True)
-    task_id = db.Column(db.Integer, db.ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False)
-    user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=False)
-    comment_text = db.Column(db.Text, nullable=False)
-    is_alert = db.Column(db.Integer, nullable=False, default=0)
-    media_attachments = db.Column(db.Text)
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-
-class Message(db.Model):
-    __tablename__ = 'messages'
-    id = db.Column(db.Integer, primary_key=True)
-    conversation_id = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=False)
-    message_text = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-
-# In app.py, add this class with your other models
-
-class Invitation(db.Model):
-    __tablename__ = 'invitations'
-    id = db.Column(db.Integer, primary_key=True)
-    token = db.Column(db.Text, unique=True, nullable=False)
-    email = db.Column(db.Text, nullable=False)
-    project_id = db.Column(db.Text, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
-    role = db.Column(db.Text, nullable=False)
-    status = db.Column(db.Text, nullable=False, default='pending') # pending, accepted
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-    accepted_at = db.Column(db.TIMESTAMP)
-    accepted_by_user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'))
+Compress(app)
+# With REDIS_URL set, broadcasts go through Redis so clients connected to any
+# worker process receive them; without it SocketIO stays in-process.
+# Packets are encoded with flask.json so they share the orjson provider above.
+socketio = SocketIO(app, async_mode='eventlet', message_queue=os.environ.get('REDIS_URL'),
+                    json=flask_json, cors_allowed_origins=CORS_ORIGINS)
+# The same Redis also holds sessions server-side, so the cookie carries only a
+# session id. Without it Flask's signed-cookie sessions are used.
+redis_client = redis.Redis.from_url(os.environ['REDIS_URL']) if os.environ.get('REDIS_URL') else None
+if redis_client is not None:
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis_client
+    # Also the TTL of each session key, so abandoned sessions expire out of Redis
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=int(os.environ.get('SESSION_LIFETIME_DAYS', 7)))
+    Session(app)
+
+# --- Hot Queries ---
+# Built once at import with bound parameters, so every request reuses the same
+# statement object and hits SQLAlchemy's compiled cache.
+# List queries select plain columns: the rows go straight into JSON, so there
+# is no point building ORM instances for them.
+_TASKS_PAGE_STMT = select(Task.id, Task.project_id, Task.title, Task.description, Task.status,
+                          Task.priority, Task.due_date, Task.assignee_id, Task.created_at,
+                          User.name.label('assignee_name'), db.func.count(Comment.id).label('comment_count'))\
+    .select_from(Task)\
+    .outerjoin(Task.assignee)\
+    .outerjoin(Comment, Comment.task_id == Task.id)\
+    .where(Task.project_id == bindparam('project_id'))\
+    .group_by(Task.id, User.name)\
+    .order_by(Task.created_at.desc(), Task.id.desc())\
+    .limit(bindparam('limit'))
+# created_at is not unique, so the cursor carries the id as a tie-breaker
+_TASKS_PAGE_BEFORE_STMT = _TASKS_PAGE_STMT.where(
+    tuple_(Task.created_at, Task.id) < tuple_(bindparam('before_ts', type_=Task.created_at.type), bindparam('before_id')))
+
+_MESSAGES_SELECT = select(Message.id, Message.conversation_id, Message.user_id, User.name.label('user_name'),
+                          Message.message_text, Message.created_at)\
+    .select_from(Message)\
+    .join(Message.user)\
+    .where(Message.conversation_id == bindparam('conversation_id'))
+_MESSAGES_PAGE_STMT = _MESSAGES_SELECT.order_by(Message.created_at.desc(), Message.id.desc()).limit(bindparam('limit'))
+_MESSAGES_PAGE_BEFORE_STMT = _MESSAGES_PAGE_STMT.where(
+    tuple_(Message.created_at, Message.id) < tuple_(bindparam('before_ts', type_=Message.created_at.type), bindparam('before_id')))
+# Incremental poll: only messages newer than the last id the client holds, oldest
+# first. A range on the primary key, so an empty poll touches no rows.
+_MESSAGES_AFTER_STMT = _MESSAGES_SELECT.where(Message.id > bindparam('after_id'))\
+    .order_by(Message.id)\
+    .limit(bindparam('limit'))
+
+_COMMENTS_STMT = select(Comment.id, Comment.comment_text, User.name.label('user_name'), Comment.created_at)\
+    .select_from(Comment)\
+    .join(Comment.user)\
+    .where(Comment.task_id == bindparam('task_id'))\
+    .order_by(Comment.created_at.asc())
+
+_TASK_DETAIL_STMT = select(Task.id, Task.project_id, Task.title, Task.description, Task.status,
+                           Task.priority, Task.due_date, Task.assignee_id, User.name.label('assignee_name'))\
+    .select_from(Task)\
+    .outerjoin(Task.assignee)\
+    .where(Task.id == bindparam('task_id'))
+
+# Projects the user belongs to; the EXISTS runs as a semi-join on the project_members primary key.
+_PROJECTS_STMT = select(Project.id, Project.name, Project.description)\
+    .where(select(ProjectMember.project_id)
+           .where(ProjectMember.project_id == Project.id, ProjectMember.user_id == bindparam('user_id'))
+           .exists())\
+    .order_by(Project.name)
+
+_PROJECT_MEMBERS_STMT = select(User.id, User.name, User.role)\
+    .join(ProjectMember, User.id == ProjectMember.user_id)\
+    .where(ProjectMember.project_id == bindparam('project_id'))
+
+_ADD_PROJECT_MEMBER_STMT = pg_insert(ProjectMember)\
+    .values(project_id=bindparam('project_id'), user_id=bindparam('user_id'))\
+    .on_conflict_do_nothing(index_elements=['project_id', 'user_id'])\
+    .returning(ProjectMember.user_id)
+
+_DELETE_USER_STMT = delete(User).where(User.id == bindparam('user_id')).returning(User.name)
+
+_USER_PROJECTS_STMT = select(ProjectMember.project_id).where(ProjectMember.user_id == bindparam('user_id'))
+
+_PROJECT_SUMMARY_STMT = select(Project.id, Project.name).where(Project.id == bindparam('project_id'))
+
+_TASK_PROJECT_STMT = select(Task.project_id).where(Task.id == bindparam('task_id'))
+
+_DELETE_TASK_STMT = delete(Task).where(Task.id == bindparam('task_id')).returning(Task.project_id)
+
+# Just the columns login needs, as a plain row. Served by ix_users_email_lower;
+# callers pass the email already lowercased.
+_LOGIN_FIELDS_STMT = select(*(getattr(User, field) for field in User.SAFE_FIELDS), User.password_hash)\
+    .where(db.func.lower(User.email) == bindparam('email'))
+
+# Reports in one round trip whether an email already belongs to a user ('user')
+# or has a pending invitation ('invitation'). A UNION ALL has no inherent row order,
+# so users are given the lower priority value and sorted first to take precedence.
+_INVITE_CONFLICT_STMT = union_all(
+    select(literal('user').label('src'), literal(0).label('priority'))
+        .where(db.func.lower(User.email) == bindparam('email')),
+    select(literal('invitation').label('src'), literal(1).label('priority'))
+        .where(Invitation.email == bindparam('email'), Invitation.status == 'pending'),
+).order_by('priority').limit(1)
 
 # --- NEW: WebSocket Event Handlers ---
 # These functions handle events from our live chat connection
 
 @socketio.on('connect')
 def handle_connect():
-    print(f"Client connected: {request.sid}")
+    logger.debug("Client connected: %s", request.sid)
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print(f"Client disconnected: {request.sid}")
+    logger.debug("Client disconnected: %s", request.sid)
 
 @socketio.on('join_room')
 def handle_join_room(data):
     room = data['conversation_id']
     join_room(room)
-    print(f"Client {request.sid} joined room: {room}")
+    logger.debug("Client %s joined room: %s", request.sid, room)
 
 @socketio.on('leave_room')
 def handle_leave_room(data):
     room = data['conversation_id']
     leave_room(room)
-    print(f"Client {request.sid} left room: {room}")
+    logger.debug("Client %s left room: %s", request.sid, room)
+
+# --- Current User ---
+
+@functools.lru_cache(maxsize=1024)
+def get_cached_user(user_id):
+    """Returns the public fields of a user, cached per process. Call cache_clear() after deleting a user."""
+    user = db.session.get(User, user_id)
+    return user.to_public_dict() if user else None
+
+# Encoded once; each rejected request still gets its own Response object.
+_UNAUTHORIZED_BODY = orjson.dumps({"error": "Unauthorized"})
+
+# API endpoints that can be called without a session; everything else under /api/ needs one.
+PUBLIC_API_ENDPOINTS = frozenset({'login_api', 'logout_api'})
+
+@app.before_request
+def authenticate_request():
+    """Rejects unauthenticated /api/ requests with a 401 and exposes the user as g.user_id and g.current_user."""
+    if request.method == 'OPTIONS':
+        # CORS preflights never carry credentials; answer straight away and let Flask-Cors add its headers
+        return app.response_class(status=204)
+    user_id = session.get('user_id')
+    if not user_id and request.path.startswith('/api/') and request.endpoint not in PUBLIC_API_ENDPOINTS:
+        return app.response_class(_UNAUTHORIZED_BODY, status=401, mimetype='application/json')
+    g.user_id = user_id
+    g.current_user = get_cached_user(user_id) if user_id else None
+
+# --- Query Budget ---
+# In debug runs every request counts the SQL statements it issues and logs a
+# warning when an endpoint goes over its budget, so an N+1 regression shows up
+# in the dev log as soon as a list has more than a handful of rows. Budgets
+# include the one-off user lookup in authenticate_request.
+DEFAULT_QUERY_BUDGET = 4
+QUERY_BUDGETS = {
+    'get_projects_api': 2,
+    'get_project_members_api': 2,
+    'get_tasks_api': 2,
+    'get_task_detail_api': 2,
+    'get_comments_api': 2,
+    'get_chat_messages': 2,
+}
+
+if get_debug_flag():
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def count_request_query(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+
+    @app.after_request
+    def check_query_budget(response):
+        budget = QUERY_BUDGETS.get(request.endpoint, DEFAULT_QUERY_BUDGET)
+        if g.get('query_count', 0) > budget:
+            logger.warning("%s issued %d queries (budget %d)", request.endpoint, g.query_count, budget)
+        return response
+
+# --- Pagination ---
+# List endpoints use keyset pagination on (created_at, id): ?before=<cursor>&limit=N.
+# The cursor for the next (older) page is returned in the X-Next-Cursor header as
+# '<iso timestamp>_<id>'; clients pass it back unchanged.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def format_cursor(created_at, row_id):
+    return f'{created_at.isoformat()}_{row_id}'
+
+def get_page_args():
+    """Returns (before, limit) from the query string, before being a (created_at, id) pair or None.
+    Raises ValueError for a malformed cursor."""
+    before = request.args.get('before')
+    if before:
+        created_at, _, row_id = before.rpartition('_')
+        before = (datetime.fromisoformat(created_at), int(row_id))
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return before, max(1, min(limit, MAX_PAGE_SIZE))
+
+def page_params(before):
+    """Bind values for the *_PAGE_BEFORE statements."""
+    before_ts, before_id = before or (None, None)
+    return {'before_ts': before_ts, 'before_id': before_id}
+
+def paginated_response(items, next_cursor):
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+# --- Response Cache ---
+# With Redis available, rendered task-list pages are kept in one hash per project
+# ("tasks:<project_id>", a field per page) for TASKS_CACHE_TTL seconds. Every write
+# that changes a project's tasks or comment counts deletes the whole hash; the TTL
+# bounds staleness from changes made elsewhere, such as a renamed or deleted user.
+# Redis errors are logged and treated as a cache miss.
+TASKS_CACHE_TTL = 30
+
+def get_cached_tasks_page(project_id, page):
+    """Returns (body, next_cursor) for a cached page, or None on a miss."""
+    if redis_client is None:
+        return None
+    try:
+        body, next_cursor = redis_client.hmget(f'tasks:{project_id}', page, f'{page}:cursor')
+    except redis.RedisError as e:
+        logger.warning("Task cache read failed: %s", e)
+        return None
+    if body is None:
+        return None
+    return body, next_cursor.decode('utf-8') if next_cursor else None
+
+def cache_tasks_page(project_id, page, body, next_cursor):
+    if redis_client is None:
+        return
+    key = f'tasks:{project_id}'
+    try:
+        with redis_client.pipeline() as pipe:
+            pipe.hset(key, mapping={page: body, f'{page}:cursor': next_cursor or ''})
+            pipe.expire(key, TASKS_CACHE_TTL)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Task cache write failed: %s", e)
+
+def invalidate_tasks_cache(project_id):
+    if redis_client is None:
+        return
+    try:
+        redis_client.delete(f'tasks:{project_id}')
+    except redis.RedisError as e:
+        logger.warning("Task cache invalidation failed for project %s: %s", project_id, e)
+
+# Member lists change only when someone joins or leaves a project, so the rendered
+# list is kept as "members:<project_id>" for MEMBERS_CACHE_TTL seconds and dropped
+# after any commit that adds or removes a membership.
+MEMBERS_CACHE_TTL = 300
+
+def get_cached_members(project_id):
+    """Returns the cached member-list body, or None on a miss."""
+    if redis_client is None:
+        return None
+    try:
+        return redis_client.get(f'members:{project_id}')
+    except redis.RedisError as e:
+        logger.warning("Member cache read failed: %s", e)
+        return None
+
+def cache_members(project_id, body):
+    if redis_client is None:
+        return
+    try:
+        redis_client.set(f'members:{project_id}', body, ex=MEMBERS_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning("Member cache write failed: %s", e)
+
+def invalidate_members_cache(*project_ids):
+    if redis_client is None or not project_ids:
+        return
+    try:
+        redis_client.delete(*(f'members:{project_id}' for project_id in project_ids))
+    except redis.RedisError as e:
+        logger.warning("Member cache invalidation failed for projects %s: %s", project_ids, e)
 
 # --- Database Initialization Command ---
 @app.cli.command('init-db')
 def init_db_command():
     """Creates all database tables and seeds mock data."""
-    db.drop_all()
-    db.create_all()
-    hashed_password = bcrypt.generate_password_hash('password123').decode('utf-8')
-    owner = User(id='owner01', email='owner@workbuddy.pro', name='Owner User', password_hash=hashed_password, role='Owner')
-    foreman = User(id='foremanA', email='alice@workbuddy.pro', name='Foreman Alice', password_hash=hashed_password, role='Foreman')
-    worker = User(id='workerX', email='bob@workbuddy.pro', name='Worker Bob', password_hash=hashed_password, role='Worker')
-    project_alpha = Project(id='proj_alpha', name='Project Alpha - Downtown Renovation', description='Renovation of library.', owner_id='owner01')
-    db.session.add_all([owner, foreman, worker, project_alpha])
-    db.session.commit()
-    member1 = ProjectMember(project_id='proj_alpha', user_id='owner01')
-    member2 = ProjectMember(project_id='proj_alpha', user_id='foremanA')
-    member3 = ProjectMember(project_id='proj_alpha', user_id='workerX')
-    db.session.add_all([member1, member2, member3])
+    # Drop and recreate in one DDL transaction; after the drop no table exists, so skip create's checks
+    with db.engine.begin() as conn:
+        db.metadata.drop_all(conn)
+        db.metadata.create_all(conn, checkfirst=False)
+    # All demo users share one password, so hash it once; debug and test runs use the minimum cost.
+    hashed_password = bcrypt.generate_password_hash('password123', 4 if app.debug or app.testing else None).decode('utf-8')
+    users = [
+        {'id': 'owner01', 'email': 'owner@workbuddy.pro', 'name': 'Owner User', 'password_hash': hashed_password, 'role': 'Owner'},
+        {'id': 'foremanA', 'email': 'alice@workbuddy.pro', 'name': 'Foreman Alice', 'password_hash': hashed_password, 'role': 'Foreman'},
+        {'id': 'workerX', 'email': 'bob@workbuddy.pro', 'name': 'Worker Bob', 'password_hash': hashed_password, 'role': 'Worker'},
+    ]
+    projects = [{'id': 'proj_alpha', 'name': 'Project Alpha - Downtown Renovation', 'description': 'Renovation of library.', 'owner_id': 'owner01'}]
+    members = [{'project_id': 'proj_alpha', 'user_id': user['id']} for user in users]
+    # One multi-row INSERT per table, in foreign-key order, all in one transaction
+    db.session.execute(insert(User), users)
+    db.session.execute(insert(Project), projects)
+    db.session.execute(insert(ProjectMember), members)
     db.session.commit()
     print('Initialized and seeded the database.')
 
+@app.cli.command('create-indexes')
+def create_indexes_command():
+    """Builds any model indexes missing from an existing database without blocking writes."""
+    # The CONCURRENTLY flag goes on a scratch copy of the tables, not on the models' own metadata
+    scratch = MetaData()
+    indexes = [index for table in db.metadata.sorted_tables for index in table.to_metadata(scratch).indexes]
+    failed = []
+    # CONCURRENTLY cannot run inside a transaction, so each statement autocommits.
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        invalid = set()
+        if conn.dialect.name == 'postgresql':
+            # Index builds on big tables legitimately outlast the per-statement API timeout
+            conn.exec_driver_sql('SET statement_timeout = 0')
+            # A failed concurrent build leaves an INVALID index that IF NOT EXISTS would skip for good
+            invalid = set(conn.exec_driver_sql(
+                'SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid').scalars())
+        for index in indexes:
+            if index.name in invalid:
+                print(f'Index {index.name} exists but is INVALID.', file=sys.stderr)
+                failed.append(index.name)
+                continue
+            index.dialect_kwargs['postgresql_concurrently'] = True
+            try:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+            except SQLAlchemyError as e:
+                print(f'Failed to build index {index.name}: {getattr(e, "orig", e)}', file=sys.stderr)
+                failed.append(index.name)
+                continue
+            print(f'Ensured index {index.name}.')
+    if failed:
+        message = (f'{len(failed)} index(es) not built: {", ".join(failed)}. Fix the cause '
+                   '(e.g. rows that break a unique index) and rerun create-indexes.')
+        if db.engine.dialect.name == 'postgresql':
+            # A concurrent build that fails still leaves its index behind, marked INVALID
+            drops = ' '.join(f'DROP INDEX CONCURRENTLY IF EXISTS {name};' for name in failed)
+            message += f' First drop the INVALID leftovers: {drops}'
+        raise click.ClickException(message)
+
 # --- API Routes ---
 # In app.py, replace all your existing @app.route functions with this block
 
@@ -157,15 +492,24 @@ def index():
     return jsonify({"status": "TaskGenius API is running."})
 
 # --- Auth APIs ---
+_DUMMY_PASSWORD_HASH = make_dummy_password_hash(bcrypt)
+
 @app.route('/api/v1/login', methods=['POST'])
 def login_api():
     data = request.json
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({"error": "Email and password are required."}), 400
-    user = User.query.filter_by(email=data['email']).first()
-    if user and bcrypt.check_password_hash(user.password_hash, data['password']):
-        user_data = {k: v for k, v in user.__dict__.items() if not k.startswith('_') and k != 'password_hash'}
-        session['current_user'] = user_data
+    user = db.session.execute(_LOGIN_FIELDS_STMT, {'email': data['email'].strip().lower()}).first()
+    # bcrypt is CPU-bound C code that never yields to the eventlet hub, so run it
+    # on a native thread to keep chat and API traffic flowing during logins.
+    # Unknown emails are checked against a dummy hash so they take as long as a wrong password.
+    password_ok = tpool.execute(bcrypt.check_password_hash,
+                                user.password_hash if user else _DUMMY_PASSWORD_HASH, data['password'])
+    if user and password_ok:
+        user_data = {field: getattr(user, field) for field in User.SAFE_FIELDS}
+        # Keep the signed session cookie small: the rest of the user is resolved per request.
+        session['user_id'] = user.id
+        session['role'] = user.role
         return jsonify({"success": True, "user": user_data}), 200
     return jsonify({"error": "Invalid email or password."}), 401
 
@@ -178,70 +522,69 @@ def logout_api():
 
 @app.route('/api/v1/users', methods=['GET'])
 def get_all_users_api():
-    if 'current_user' not in session:
-        return jsonify({"error": "Unauthorized"}), 401
-
     # In a real app with multiple companies, you would filter this list.
     # For now, we return all users except the one making the request.
     try:
-        current_user_id = session['current_user']['id']
-        all_users = User.query.filter(User.id != current_user_id).order_by(User.name).all()
-
-        users_list = [
-            {"id": user.id, "name": user.name, "role": user.role}
-            for user in all_users
-        ]
+        users_list = [user for user in get_user_directory() if user['id'] != g.user_id]
         return jsonify(users_list)
     except Exception as e:
-        print(f"Error fetching all users: {e}")
+        logger.error("Error fetching all users: %s", e)
         return jsonify({"error": "Server error while fetching users."}), 500
 
 @app.route('/api/v1/users/<user_id>', methods=['DELETE'])
 def delete_user_api(user_id):
     # --- Authorization ---
-    if 'current_user' not in session:
-        return jsonify({"error": "Unauthorized"}), 401
-
     # CRITICAL: This is a highly privileged action. Only allow a user with the 'Owner' role.
-    if session['current_user']['role'] != 'Owner':
+    if session['role'] != 'Owner':
         return jsonify({"error": "Forbidden. You do not have permission to delete users."}), 403
 
     # Add a check to prevent an owner from deleting their own account.
-    if session['current_user']['id'] == user_id:
+    if g.user_id == user_id:
         return jsonify({"error": "Owners cannot delete their own account via the API."}), 400
 
     try:
-        user_to_delete = User.query.get(user_id)
-
-        if not user_to_delete:
-            return jsonify({"error": "User not found"}), 404
-
         # Our database schema is set up with 'ON DELETE SET NULL' for task creators/assignees
         # and 'ON DELETE CASCADE' for project memberships, so the database will handle
         # cleaning up all the references correctly when we delete the user from the 'users' table.
-        db.session.delete(user_to_delete)
+        # Their memberships are removed by the cascade; note which member lists that changes
+        member_of = db.session.scalars(_USER_PROJECTS_STMT, {'user_id': user_id}).all() if redis_client is not None else []
+        name = db.session.execute(_DELETE_USER_STMT, {'user_id': user_id}).scalar()
+        if name is None:
+            return jsonify({"error": "User not found"}), 404
         db.session.commit()
+        get_cached_user.cache_clear()
+        invalidate_user_directory()
+        invalidate_members_cache(*member_of)
 
-        return jsonify({"message": f"User '{user_to_delete.name}' has been deleted successfully."}), 200
+        return jsonify({"message": f"User '{name}' has been deleted successfully."}), 200
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error deleting user {user_id}: {e}")
+        logger.error("Error deleting user %s: %s", user_id, e)
         return jsonify({"error": "A server error occurred while deleting the user."}), 500
 
 # --- Invitation APIs ---
+_PENDING_INVITATION_INDEX = next(index for index in Invitation.__table__.indexes
+                                 if index.name == 'ix_invitations_email_pending')
+
+def is_unique_violation(error, index):
+    """True if an IntegrityError was raised by the given unique index."""
+    diag = getattr(error.orig, 'diag', None)
+    if diag is not None:
+        # psycopg2 reports the violated constraint by name
+        return diag.constraint_name == index.name
+    # SQLite only names the columns: "UNIQUE constraint failed: invitations.email"
+    columns = ', '.join(f'{index.table.name}.{column.name}' for column in index.columns)
+    return str(error.orig) == f'UNIQUE constraint failed: {columns}'
 
 @app.route('/api/v1/projects/<project_id>/invitations', methods=['POST'])
 def create_invitation_api(project_id):
     # --- Authorization ---
-    if 'current_user' not in session:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if session['current_user']['role'] != 'Owner':
+    if session['role'] != 'Owner':
         return jsonify({"error": "Forbidden. Only Owners can send invitations."}), 403
 
     data = request.json
-    email = data.get('email')
+    email = (data.get('email') or '').strip().lower()
     role = data.get('role')
 
     # --- Validation ---
@@ -249,18 +592,19 @@ def create_invitation_api(project_id):
         return jsonify({"error": "Email and role are required."}), 400
     if role not in ['Foreman', 'Worker']:
         return jsonify({"error": "Invalid role specified. Must be 'Foreman' or 'Worker'."}), 400
+    if get_project(project_id) is None:
+        return jsonify({"error": "Project not found"}), 404
 
-    # Check if a user with this email already exists in the system
-    if User.query.filter_by(email=email).first():
+    # Check if a user or a pending invitation already exists for this email
+    conflict = db.session.execute(_INVITE_CONFLICT_STMT, {'email': email}).scalar()
+    if conflict == 'user':
         return jsonify({"error": "A user with this email already exists."}), 409 # 409 Conflict code
-
-    # Check if a pending invitation for this email already exists
-    if Invitation.query.filter_by(email=email, status='pending').first():
+    if conflict == 'invitation':
         return jsonify({"error": "An invitation for this email is already pending."}), 409
 
     try:
-        # Generate a unique, secure token for the invitation link
-        token = str(uuid.uuid4())
+        # Generate a unique, secure, URL-safe token for the invitation link
+        token = secrets.token_urlsafe(24)
 
         new_invitation = Invitation(
             token=token,
@@ -282,53 +626,52 @@ def create_invitation_api(project_id):
             "invite_link_for_testing": invite_link
         }), 201
 
+    except IntegrityError as e:
+        db.session.rollback()
+        if is_unique_violation(e, _PENDING_INVITATION_INDEX):
+            # Another request invited the same email between the check above and this insert
+            return jsonify({"error": "An invitation for this email is already pending."}), 409
+        logger.error("Error creating invitation: %s", e)
+        return jsonify({"error": "A server error occurred while creating the invitation."}), 500
     except Exception as e:
         db.session.rollback()
-        print(f"Error creating invitation: {e}")
+        logger.error("Error creating invitation: %s", e)
         return jsonify({"error": "A server error occurred while creating the invitation."}), 500
 
 # --- Project APIs ---
 @app.route('/api/v1/projects', methods=['GET'])
 def get_projects_api():
-    if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
-    # In a real app, you would filter projects based on the user's membership in the project_members table.
-    # For now, we return all projects.
-    projects_db = Project.query.order_by(Project.name).all()
-    projects_list = [{'id': p.id, 'name': p.name, 'description': p.description} for p in projects_db]
-    return jsonify(projects_list)
+    projects_list = [{'id': id_, 'name': name, 'description': description}
+                     for id_, name, description in db.session.execute(_PROJECTS_STMT, {'user_id': g.user_id})]
+    return conditional_response(jsonify(projects_list))
 
 # In app.py, add this new API route
 
 @app.route('/api/v1/projects/<project_id>/members', methods=['GET'])
 def get_project_members_api(project_id):
-    if 'current_user' not in session:
-        return jsonify({"error": "Unauthorized"}), 401
 
     # In a real app, first verify the current user is also a member of this project
 
     try:
-        # This query joins our three tables: project_members, users, and projects
-        # to find all users for a given project_id.
-        members = db.session.query(User).join(ProjectMember, User.id == ProjectMember.user_id).filter(ProjectMember.project_id == project_id).all()
+        cached = get_cached_members(project_id)
+        if cached is not None:
+            return conditional_response(app.response_class(cached, mimetype='application/json'))
 
-        members_list = []
-        for member in members:
-            members_list.append({
-                "id": member.id,
-                "name": member.name,
-                "role": member.role
-            })
+        # Joins project_members to users to find all users for the given project_id.
+        rows = db.session.execute(_PROJECT_MEMBERS_STMT, {'project_id': project_id})
+        members_list = [{"id": member_id, "name": name, "role": role} for member_id, name, role in rows]
 
-        return jsonify(members_list)
+        response = jsonify(members_list)
+        cache_members(project_id, response.get_data())
+        return conditional_response(response)
 
     except Exception as e:
-        print(f"Error fetching members for project {project_id}: {e}")
+        logger.error("Error fetching members for project %s: %s", project_id, e)
         return jsonify({"error": "Server error while fetching project members."}), 500
 
 @app.route('/api/v1/select-project/<project_id>', methods=['POST'])
 def select_project_api(project_id):
-    if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
-    project = Project.query.get(project_id)
+    project = db.session.execute(_PROJECT_SUMMARY_STMT, {'project_id': project_id}).first()
     if project:
         # Here too, you'd verify the user is a member of this project.
         session['current_project'] = {'id': project.id, 'name': project.name}
@@ -337,109 +680,105 @@ def select_project_api(project_id):
 
 # --- Task APIs ---
 
+def ensure_project_member(project_id, user_id):
+    """Adds the user to the project in one statement; a no-op if they are already a member.
+
+    Returns True if a membership was added, so the caller can drop the member cache after committing.
+    """
+    result = db.session.execute(_ADD_PROJECT_MEMBER_STMT, {'project_id': project_id, 'user_id': user_id})
+    return result.first() is not None
+
 @app.route('/api/v1/projects/<project_id>/tasks', methods=['GET'])
 def get_tasks_api(project_id):
-    if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
     # Add authorization check here
     try:
-        tasks_with_assignee = db.session.query(Task, User.name.label('assignee_name'))\
-            .outerjoin(User, Task.assignee_id == User.id)\
-            .filter(Task.project_id == project_id).order_by(Task.created_at.desc()).all()
-        tasks_list = []
-        for task_obj, assignee_name in tasks_with_assignee:
-            tasks_list.append({
-                'id': task_obj.id,
-                'project_id': task_obj.project_id, 
-                'title': task_obj.title, 
-                'description': task_obj.description,
-                'status': task_obj.status, 
-                'is_completed': task_obj.status == 'Done',
-                'priority': task_obj.priority, 
-                'due_date': task_obj.due_date,
-                'assignee_id': task_obj.assignee_id, 
-                'assignee_name': assignee_name
-            })
-        return jsonify(tasks_list)
+        before, limit = get_page_args()
+    except ValueError:
+        return jsonify({"error": "Invalid 'before' cursor."}), 400
+    try:
+        # One grouped query returns each task with its assignee name and comment
+        # count, so the list never falls back to per-task lookups.
+        page = f"{format_cursor(*before) if before else ''}:{limit}"
+        cached = get_cached_tasks_page(project_id, page)
+        if cached:
+            body, next_cursor = cached
+            response = app.response_class(body, mimetype='application/json')
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+            return conditional_response(response)
+
+        stmt = _TASKS_PAGE_BEFORE_STMT if before else _TASKS_PAGE_STMT
+        rows = db.session.execute(stmt, {'project_id': project_id, 'limit': limit, **page_params(before)}).mappings().all()
+        # Each row is already keyed by the response field names; created_at and id double as the page cursor
+        tasks_list = [{**row, 'is_completed': row['status'] == 'Done'} for row in rows]
+        next_cursor = format_cursor(rows[-1]['created_at'], rows[-1]['id']) if len(rows) == limit else None
+        response = paginated_response(tasks_list, next_cursor)
+        cache_tasks_page(project_id, page, response.get_data(), response.headers.get('X-Next-Cursor'))
+        return conditional_response(response)
     except Exception as e:
-        print(f"Error fetching tasks: {e}")
+        logger.error("Error fetching tasks: %s", e)
         return jsonify({"error": "Server error while fetching tasks."}), 500
 
 @app.route('/api/v1/projects/<project_id>/tasks', methods=['POST'])
 def add_task_api(project_id):
-    if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
     # ... (rest of auth checks) ...
     data = request.json
     if not data or not data.get('title'): return jsonify({"error": "Title is required"}), 400
 
     try:
-        assignee_id = data.get('assignee_id') or session['current_user']['id']
-
-        # --- NEW LOGIC ---
-        # Check if the assignee is already a member of the project
-        membership = ProjectMember.query.filter_by(project_id=project_id, user_id=assignee_id).first()
-        if not membership:
-            # If not a member, add them automatically
-            new_member = ProjectMember(project_id=project_id, user_id=assignee_id)
-            db.session.add(new_member)
-            print(f"Auto-adding user {assignee_id} to project {project_id}")
-        # --- END OF NEW LOGIC ---
+        assignee_id = data.get('assignee_id') or g.user_id
+
+        # Make sure the assignee is a member of the project
+        member_added = ensure_project_member(project_id, assignee_id)
 
         new_task = Task(project_id=project_id, title=data['title'].strip(), description=data.get('description', ''),
                         due_date=data.get('due_date'), priority=data.get('priority', 'Medium'),
-                        creator_id=session['current_user']['id'], assignee_id=assignee_id)
+                        creator_id=g.user_id, assignee_id=assignee_id)
         db.session.add(new_task)
         db.session.commit()
+        invalidate_tasks_cache(project_id)
+        if member_added:
+            invalidate_members_cache(project_id)
         return jsonify({'id': new_task.id, 'message': 'Task created and user membership verified.'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Server error while creating task.", "details": str(e)}), 500
 
 
-# In app.py, replace your update_task_api function
+# Fields a client may change through PUT /api/v1/tasks/<id>
+TASK_UPDATABLE_FIELDS = ('title', 'description', 'status', 'priority', 'due_date', 'assignee_id')
 
 @app.route('/api/v1/tasks/<int:task_id>', methods=['PUT'])
 def update_task_api(task_id):
-    if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
-    task_to_update = Task.query.get_or_404(task_id)
     # ... (auth logic) ...
-    data = request.json
-
-    assignee_id = data.get('assignee_id', task_to_update.assignee_id)
-    if assignee_id:
-        # --- NEW LOGIC ---
-        # Check if the new assignee is already a member of the project
-        membership = ProjectMember.query.filter_by(project_id=task_to_update.project_id, user_id=assignee_id).first()
-        if not membership:
-            new_member = ProjectMember(project_id=task_to_update.project_id, user_id=assignee_id)
-            db.session.add(new_member)
-            print(f"Auto-adding user {assignee_id} to project {task_to_update.project_id}")
-        # --- END OF NEW LOGIC ---
-
-    # Update task fields
-    task_to_update.title = data.get('title', task_to_update.title)
-    task_to_update.description = data.get('description', task_to_update.description)
-    task_to_update.status = data.get('status', task_to_update.status)
-    task_to_update.priority = data.get('priority', task_to_update.priority)
-    task_to_update.due_date = data.get('due_date', task_to_update.due_date) # <<< ENSURE THIS LINE IS PRESENT
-    task_to_update.assignee_id = data.get('assignee_id', task_to_update.assignee_id)
+    data = request.json or {}
+    changes = {field: data[field] for field in TASK_UPDATABLE_FIELDS if field in data}
 
     try:
+        # One UPDATE ... RETURNING applies the change and tells us whether the task exists
+        project_id = db.session.execute(
+            update(Task).where(Task.id == task_id).values(**changes).returning(Task.project_id)
+        ).scalar_one_or_none()
+        if project_id is None:
+            db.session.rollback()
+            return jsonify({"error": "Task not found"}), 404
+        # Make sure the new assignee is a member of the project
+        member_added = bool(changes.get('assignee_id')) and ensure_project_member(project_id, changes['assignee_id'])
         db.session.commit()
-        return jsonify({'id': task_to_update.id, 'message': 'Task updated successfully.'})
+        invalidate_tasks_cache(project_id)
+        if member_added:
+            invalidate_members_cache(project_id)
+        return jsonify({'id': task_id, 'message': 'Task updated successfully.'})
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Server error while updating task.", "details": str(e)}), 500
 
 @app.route('/api/v1/tasks/<int:task_id>', methods=['GET'])
 def get_task_detail_api(task_id):
-    if 'current_user' not in session:
-        return jsonify({"error": "Unauthorized"}), 401
 
     try:
         # Fetch the specific task and join with the User table to get the assignee's name
-        task_data = db.session.query(Task, User.name.label('assignee_name'))\
-            .outerjoin(User, Task.assignee_id == User.id)\
-            .filter(Task.id == task_id).first()
+        task_data = db.session.execute(_TASK_DETAIL_STMT, {'task_id': task_id}).first()
 
         if not task_data:
             return jsonify({"error": "Task not found"}), 404
@@ -447,59 +786,45 @@ def get_task_detail_api(task_id):
         # In a real app, you would add a security check here to ensure the current user
         # is a member of the project that this task belongs to.
 
-        task_obj, assignee_name = task_data
-
-        # Convert the task object to a dictionary for JSON response
-        task_dict = {
-            'id': task_obj.id,
-            'project_id': task_obj.project_id,
-            'title': task_obj.title,
-            'description': task_obj.description,
-            'status': task_obj.status,
-            'priority': task_obj.priority,
-            'due_date': task_obj.due_date,
-            'assignee_id': task_obj.assignee_id,
-            'assignee_name': assignee_name
-            # We can add creator info here too if needed
-        }
-        return jsonify(task_dict)
+        # The selected columns are exactly the response fields
+        # (creator info can be added to _TASK_DETAIL_STMT if needed)
+        return jsonify(dict(task_data._mapping))
 
     except Exception as e:
-        print(f"Error fetching detail for task {task_id}: {e}")
+        logger.error("Error fetching detail for task %s: %s", task_id, e)
         return jsonify({"error": "Server error while fetching task details."}), 500
 
 @app.route('/api/v1/tasks/<int:task_id>', methods=['DELETE'])
 def delete_task_api(task_id):
-    if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
-    task = Task.query.get_or_404(task_id)
     # Add authorization logic here
-    db.session.delete(task)
+    # Comments go with the task through the comments.task_id ON DELETE CASCADE
+    project_id = db.session.execute(_DELETE_TASK_STMT, {'task_id': task_id}).scalar_one_or_none()
+    if project_id is None:
+        db.session.rollback()
+        return jsonify({"error": "Task not found"}), 404
     db.session.commit()
+    invalidate_tasks_cache(project_id)
     return jsonify({'message': 'Task deleted successfully'}), 200
 
 # --- Comment APIs ---
 
 @app.route('/api/v1/tasks/<int:task_id>/comments', methods=['GET'])
 def get_comments_api(task_id):
-    if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
-    comments_with_user = db.session.query(Comment, User.name.label('user_name'))\
-        .join(User, Comment.user_id == User.id)\
-        .filter(Comment.task_id == task_id).order_by(Comment.created_at.asc()).all()
-    comments_list = []
-    for comment, user_name in comments_with_user:
-        comments_list.append({ 'id': comment.id, 'comment_text': comment.comment_text, 'user_name': user_name, 'created_at': comment.created_at.isoformat() })
-    return jsonify(comments_list)
+    comments_list = db.session.execute(_COMMENTS_STMT, {'task_id': task_id}).mappings().all()
+    return jsonify([dict(row) for row in comments_list])
 
 @app.route('/api/v1/tasks/<int:task_id>/comments', methods=['POST'])
 def add_comment_api(task_id):
-    if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
     data = request.json
     if not data or not data.get('comment_text') or not data.get('comment_text').strip():
         return jsonify({"error": "Comment text cannot be empty"}), 400
     try:
-        new_comment = Comment(task_id=task_id, user_id=session['current_user']['id'], comment_text=data['comment_text'].strip())
+        new_comment = Comment(task_id=task_id, user_id=g.user_id, comment_text=data['comment_text'].strip())
         db.session.add(new_comment)
         db.session.commit()
+        # The task's comment_count changed; look up its project only when there is a cache to clear
+        if redis_client is not None:
+            invalidate_tasks_cache(db.session.scalar(_TASK_PROJECT_STMT, {'task_id': task_id}))
         return jsonify({'id': new_comment.id, 'message': 'Comment added successfully'}), 201
     except Exception as e:
         db.session.rollback()
@@ -514,46 +839,46 @@ def add_comment_api(task_id):
 
 @app.route('/api/v1/chat/<conversation_id>/messages', methods=['GET'])
 def get_chat_messages(conversation_id):
-    # Security check: Ensure user is logged in
-    if 'current_user' not in session:
-        return jsonify({"error": "Unauthorized"}), 401
-
     # In a real app, we would also add a security check here to ensure
     # the logged-in user is a valid participant in this conversation.
 
     try:
-        # Fetch messages, joining with the users table to get the sender's name
-        messages_from_db = db.session.query(Message, User.name.label('user_name'))\
-            .join(User, Message.user_id == User.id)\
-            .filter(Message.conversation_id == conversation_id)\
-            .order_by(Message.created_at.asc()).all()
-
-        messages_list = []
-        for message, user_name in messages_from_db:
-            messages_list.append({
-                'id': message.id,
-                'conversation_id': message.conversation_id,
-                'user_id': message.user_id,
-                'user_name': user_name,
-                'message_text': message.message_text,
-                'created_at': message.created_at.isoformat()
-            })
-
-        return jsonify(messages_list)
+        before, limit = get_page_args()
+    except ValueError:
+        return jsonify({"error": "Invalid 'before' cursor."}), 400
+    after_id = request.args.get('after_id', type=int)
+
+    try:
+        if after_id is not None:
+            # Polling clients pass the id of the newest message they have and get just the new ones.
+            # A full page means there may be more; the client polls again with the last id.
+            rows = db.session.execute(_MESSAGES_AFTER_STMT, {'conversation_id': conversation_id,
+                                                             'after_id': after_id, 'limit': limit})
+            return jsonify([dict(row) for row in rows.mappings()])
+
+        # Fetch the newest page of messages, joining with the users table to get the sender's name
+        stmt = _MESSAGES_PAGE_BEFORE_STMT if before else _MESSAGES_PAGE_STMT
+        messages_from_db = db.session.execute(stmt, {'conversation_id': conversation_id, 'limit': limit,
+                                                     **page_params(before)}).all()
+        oldest = messages_from_db[-1] if len(messages_from_db) == limit else None
+        next_cursor = format_cursor(oldest.created_at, oldest.id) if oldest else None
+
+        # The page is fetched newest-first but returned in chronological order
+        messages_list = [dict(row._mapping) for row in reversed(messages_from_db)]
+
+        return paginated_response(messages_list, next_cursor)
     except Exception as e:
-        print(f"Error fetching messages for conversation {conversation_id}: {e}")
+        logger.error("Error fetching messages for conversation %s: %s", conversation_id, e)
         return jsonify({"error": "Server error while fetching messages."}), 500
 
 @app.route('/api/v1/chat/<conversation_id>/messages', methods=['POST'])
 def post_chat_message(conversation_id):
-    if 'current_user' not in session:
-        return jsonify({"error": "Unauthorized"}), 401
 
     # Add conceptual security check here for conversation participation
 
     data = request.json
     message_text = data.get('message_text')
-    user_id = session['current_user']['id']
+    user_id = g.user_id
 
     if not message_text or not message_text.strip():
         return jsonify({"error": "Message text cannot be empty"}), 400
@@ -565,31 +890,33 @@ def post_chat_message(conversation_id):
             message_text=message_text.strip()
         )
         db.session.add(new_message)
-        db.session.commit()
+        # The INSERT returns id and created_at, so the payload needs no further SELECT
+        db.session.flush()
 
-        # Fetch the user's name to include in the response
-        user = User.query.get(user_id)
-        user_name = user.name if user else "Unknown User"
+        # The sender's name comes from the cached current user rather than another SELECT
+        user_name = g.current_user['name'] if g.current_user else "Unknown"
 
         # This is the new message object we will broadcast
         message_data = {
             'id': new_message.id,
             'conversation_id': new_message.conversation_id,
             'user_id': new_message.user_id,
-            'user_name': user.name if user else "Unknown",
+            'user_name': user_name,
             'message_text': new_message.message_text,
-            'created_at': new_message.created_at.isoformat()
+            'created_at': new_message.created_at
         }
+        db.session.commit()
 
-        # <<< NEW: Broadcast the new message to everyone in the room >>>
-        socketio.emit('new_message', message_data, room=conversation_id)
+        # Broadcast the new message to everyone in the room without making the
+        # HTTP response wait on the fan-out
+        eventlet.spawn_n(socketio.emit, 'new_message', message_data, room=conversation_id)
 
         # We still return a standard HTTP response to the original sender
         return jsonify(message_data), 201
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error posting message to conversation {conversation_id}: {e}")
+        logger.error("Error posting message to conversation %s: %s", conversation_id, e)
         return jsonify({"error": "Server error while posting message."}), 500
     
 # In app.py, replace the block at the very end of the file
@@ -599,5 +926,5 @@ if __name__ == '__main__':
     # which correctly manages eventlet. It gets the port from an
     # environment variable, which services like Render provide.
     port = int(os.environ.get('PORT', 5000))
-    print(f"--> Starting Socket.IO server on port {port}")
+    logger.info("--> Starting Socket.IO server on port %s", port)
     socketio.run(app, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -1,14 +1,23 @@
 import os
 import sqlite3
 import uuid
+from datetime import timedelta
 from flask import Flask, request, jsonify, session, flash, render_template, redirect, url_for, g
-from flask_sqlalchemy import SQLAlchemy
+from models import db, User, Project, ProjectMember, Task
+from jsonprovider import ORJSONProvider
+from helpers import get_user_directory, get_project, conditional_response, make_dummy_password_hash
 from flask_bcrypt import Bcrypt
+from flask_session import Session
+import redis
+from sqlalchemy import select, insert, update, delete
 from sqlalchemy.exc import IntegrityError
 from flask_cors import CORS
 # --- App Initialization ---
 app = Flask(__name__)
-CORS(app)
+app.json = ORJSONProvider(app)
+# Comma-separated origins allowed to call the API (CORS_ORIGINS); any origin when unset.
+CORS_ORIGINS = [origin.strip() for origin in os.environ['CORS_ORIGINS'].split(',')] if os.environ.get('CORS_ORIGINS') else '*'
+CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS}}, max_age=86400)
 
 # --- Configuration ---
 # Reads the DATABASE_URL from Render's environment variables.
@@ -19,84 +28,52 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
 )
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a_default_dev_secret_key_that_is_long_and_secure')
-
-db = SQLAlchemy(app)
+# Pool sizing per worker; pre-ping and recycle replace connections the server or network has dropped.
+# LIFO hands out the most recently used connection, so the idle tail ages out via pool_recycle.
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    "pool_size": int(os.environ.get('SQL_POOL_SIZE', 10)),
+    "max_overflow": int(os.environ.get('SQL_MAX_OVERFLOW', 20)),
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+    "pool_use_lifo": True,
+}
+
+db.init_app(app)
 bcrypt = Bcrypt(app)
-
-# --- Database Models ---
-class User(db.Model):
-    __tablename__ = 'users'
-    id = db.Column(db.Text, primary_key=True)
-    email = db.Column(db.Text, unique=True, nullable=False)
-    name = db.Column(db.Text, nullable=False)
-    password_hash = db.Column(db.Text, nullable=False)
-    role = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-
-class Project(db.Model):
-    __tablename__ = 'projects'
-    id = db.Column(db.Text, primary_key=True)
-    name = db.Column(db.Text, nullable=False)
-    description = db.Column(db.Text)
-    owner_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='RESTRICT'), nullable=False)
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.now(), onupdate=db.func.now())
-
-class ProjectMember(db.Model):
-    __tablename__ = 'project_members'
-    project_id = db.Column(db.Text, db.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
-    user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
-
-class Task(db.Model):
-    __tablename__ = 'tasks'
-    id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.Text, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
-    title = db.Column(db.Text, nullable=False)
-    description = db.Column(db.Text)
-    status = db.Column(db.Text, nullable=False, default='To Do')
-    priority = db.Column(db.Text, nullable=False, default='Medium')
-    due_date = db.Column(db.Text)
-    creator_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'))
-    assignee_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'))
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.now(), onupdate=db.func.now())
-
-class Comment(db.Model):
-    __tablename__ = 'comments'
-    id = db.Column(db.Integer, primary_key=True)
-    task_id = db.Column(db.Integer, db.ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False)
-    user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=False)
-    comment_text = db.Column(db.Text, nullable=False)
-    is_alert = db.Column(db.Integer, nullable=False, default=0)
-    media_attachments = db.Column(db.Text)
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-
-class Message(db.Model):
-    __tablename__ = 'messages'
-    id = db.Column(db.Integer, primary_key=True)
-    conversation_id = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=False)
-    message_text = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.TIMESTAMP, server_default=db.func.now())
-
+# With REDIS_URL set, sessions live in Redis and the cookie carries only a session id.
+if os.environ.get('REDIS_URL'):
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis.Redis.from_url(os.environ['REDIS_URL'])
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=int(os.environ.get('SESSION_LIFETIME_DAYS', 7)))
+    Session(app)
+
+# Columns a task write hands back to the client through RETURNING
+_TASK_RESPONSE_COLUMNS = (Task.id, Task.title, Task.description, Task.status, Task.priority, Task.due_date, Task.assignee_id)
+# List rows without the free-text description, for clients that only draw the task list (?fields=summary)
+_TASK_SUMMARY_COLUMNS = tuple(column for column in _TASK_RESPONSE_COLUMNS if column is not Task.description)
+TASK_UPDATABLE_FIELDS = ('title', 'description', 'status', 'priority', 'due_date', 'assignee_id')
 
 # --- Database Initialization Command ---
 @app.cli.command('init-db')
 def init_db_command():
     """Creates the database tables and seeds initial data."""
-    db.drop_all()
-    db.create_all()
-    hashed_password = bcrypt.generate_password_hash('password123').decode('utf-8')
-    owner = User(id='owner01', email='owner@workbuddy.pro', name='Owner User', password_hash=hashed_password, role='Owner')
-    foreman = User(id='foremanA', email='alice@workbuddy.pro', name='Foreman Alice', password_hash=hashed_password, role='Foreman')
-    worker1 = User(id='workerX', email='bob@workbuddy.pro', name='Worker Bob', password_hash=hashed_password, role='Worker')
-    project_alpha = Project(id='proj_alpha', name='Project Alpha - Downtown Renovation', description='Complete renovation.', owner_id='owner01')
-    db.session.add_all([owner, foreman, worker1, project_alpha])
-    db.session.commit()
-    member1 = ProjectMember(project_id='proj_alpha', user_id='owner01')
-    member2 = ProjectMember(project_id='proj_alpha', user_id='foremanA')
-    member3 = ProjectMember(project_id='proj_alpha', user_id='workerX')
-    db.session.add_all([member1, member2])
+    # Drop and recreate in one DDL transaction; after the drop no table exists, so skip create's checks
+    with db.engine.begin() as conn:
+        db.metadata.drop_all(conn)
+        db.metadata.create_all(conn, checkfirst=False)
+    # All demo users share one password, so hash it once; debug and test runs use the minimum cost.
+    hashed_password = bcrypt.generate_password_hash('password123', 4 if app.debug or app.testing else None).decode('utf-8')
+    users = [
+        {'id': 'owner01', 'email': 'owner@workbuddy.pro', 'name': 'Owner User', 'password_hash': hashed_password, 'role': 'Owner'},
+        {'id': 'foremanA', 'email': 'alice@workbuddy.pro', 'name': 'Foreman Alice', 'password_hash': hashed_password, 'role': 'Foreman'},
+        {'id': 'workerX', 'email': 'bob@workbuddy.pro', 'name': 'Worker Bob', 'password_hash': hashed_password, 'role': 'Worker'},
+    ]
+    projects = [{'id': 'proj_alpha', 'name': 'Project Alpha - Downtown Renovation', 'description': 'Complete renovation.', 'owner_id': 'owner01'}]
+    members = [{'project_id': 'proj_alpha', 'user_id': user['id']} for user in users]
+    # One multi-row INSERT per table, in foreign-key order, all in one transaction
+    db.session.execute(insert(User), users)
+    db.session.execute(insert(Project), projects)
+    db.session.execute(insert(ProjectMember), members)
     db.session.commit()
     print('Initialized the database and seeded mock data.')
 
@@ -118,21 +95,28 @@ def tasks_page_for_project(project_id):
     # This route now primarily serves the main HTML shell for the React Native app to work within for the prototype
     # For the real native app, this route isn't strictly needed
     user = session.get('current_user')
-    project = Project.query.get(project_id) # Example of getting project details
-    users_for_assignment = User.query.all()
-    return render_template('index.html', user=user, project=project, assignable_users=users_for_assignment)
+    project = get_project(project_id) # Example of getting project details
+    return render_template('index.html', user=user, project=project, assignable_users=get_user_directory())
 
 
 # --- API v1 Routes ---
 
 # Auth
+_DUMMY_PASSWORD_HASH = make_dummy_password_hash(bcrypt)
+
 @app.route('/login', methods=['POST']) # This URL is now ambiguous, better to move all APIs under /api
 def login_route(): # This should be renamed to login_api to avoid confusion
     data = request.json
     email = data.get('email')
     password = data.get('password')
-    user = User.query.filter_by(email=email).first()
-    if user and bcrypt.check_password_hash(user.password_hash, password):
+    # Only the columns the check and the response use, as a plain row
+    user = db.session.execute(select(User.id, User.name, User.email, User.role, User.password_hash)
+                              .where(User.email == email)).first()
+    # bcrypt releases the GIL while it hashes, so a threaded worker keeps serving other requests
+    # during a check. Unknown emails are checked against a dummy hash so they take as long as a
+    # wrong password and don't reveal which accounts exist.
+    password_ok = bcrypt.check_password_hash(user.password_hash if user else _DUMMY_PASSWORD_HASH, password)
+    if user and password_ok:
         user_data = {'id': user.id, 'name': user.name, 'email': user.email, 'role': user.role}
         session['current_user'] = user_data
         return jsonify({"success": True, "user": user_data}), 200
@@ -147,9 +131,9 @@ def logout_route():
 @app.route('/select_project/<project_id>') # This should be a POST API call
 def select_project_route(project_id):
     if 'current_user' not in session: return redirect(url_for('home_page'))
-    project = Project.query.get(project_id)
+    project = get_project(project_id)
     if project:
-        session['current_project'] = {'id': project.id, 'name': project.name}
+        session['current_project'] = {'id': project['id'], 'name': project['name']}
         return redirect(url_for('tasks_page_for_project', project_id=project_id))
     return redirect(url_for('project_select_page'))
 
@@ -158,9 +142,9 @@ def select_project_route(project_id):
 def get_projects_api():
     if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
     # In real app, filter projects by user membership from project_members table
-    projects_db = Project.query.order_by(Project.name).all()
-    projects_list = [{'id': p.id, 'name': p.name, 'description': p.description} for p in projects_db]
-    return jsonify(projects_list)
+    rows = db.session.execute(select(Project.id, Project.name, Project.description).order_by(Project.name))
+    projects_list = [{'id': id_, 'name': name, 'description': description} for id_, name, description in rows]
+    return conditional_response(jsonify(projects_list))
 
 # Tasks API
 # In app.py, find your old task API routes and replace them with this block.
@@ -183,20 +167,16 @@ def get_tasks_api_v2(project_id):
 
     try:
         # This query does NOT look at request.json
-        tasks_db = db.session.query(Task, User.name.label('assignee_name'))\
-            .outerjoin(User, Task.assignee_id == User.id)\
-            .filter(Task.project_id == project_id)\
-            .order_by(Task.created_at.desc()).all()
-
-        tasks_list = []
-        for task_obj, assignee_name in tasks_db:
-            tasks_list.append({
-                'id': task_obj.id, 'title': task_obj.title, 'description': task_obj.description,
-                'status': task_obj.status, 'is_completed': task_obj.status == 'Done',
-                'priority': task_obj.priority, 'due_date': task_obj.due_date,
-                'assignee_id': task_obj.assignee_id, 'assignee_name': assignee_name
-            })
-        return jsonify(tasks_list)
+        # Plain columns straight into dicts: the rows only feed the JSON, so no Task entities are built
+        columns = _TASK_SUMMARY_COLUMNS if request.args.get('fields') == 'summary' else _TASK_RESPONSE_COLUMNS
+        rows = db.session.execute(
+            select(*columns, User.name.label('assignee_name'))
+            .outerjoin(User, Task.assignee_id == User.id)
+            .where(Task.project_id == project_id)
+            .order_by(Task.created_at.desc())
+        ).mappings()
+        tasks_list = [{**row, 'is_completed': row['status'] == 'Done'} for row in rows]
+        return conditional_response(jsonify(tasks_list))
     except Exception as e:
         print(f"Error fetching tasks: {e}")
         return jsonify({"error": "Server error while fetching tasks."}), 500
@@ -218,7 +198,7 @@ def add_task_api_v2(project_id):
     assignee_id = data.get('assignee_id') or creator_id
 
     try:
-        new_task = Task(
+        new_task = db.session.execute(insert(Task).values(
             project_id=project_id,
             title=title.strip(),
             description=data.get('description', '').strip(),
@@ -226,15 +206,13 @@ def add_task_api_v2(project_id):
             priority=data.get('priority', 'Medium'),
             creator_id=creator_id,
             assignee_id=assignee_id
-        )
-        db.session.add(new_task)
+        ).returning(Task.id, Task.title)).one()
+        assignee_name = db.session.scalar(select(User.name).where(User.id == assignee_id))
         db.session.commit()
 
-        # ... logic to return the newly created task ...
-        assignee = User.query.get(new_task.assignee_id)
         return jsonify({
             'id': new_task.id, 'title': new_task.title, # etc.
-            'assignee_name': assignee.name if assignee else None
+            'assignee_name': assignee_name
         }), 201
     except Exception as e:
         db.session.rollback()
@@ -245,34 +223,26 @@ def add_task_api_v2(project_id):
 def update_task_api_v2(task_id): # Renamed function
     if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
 
-    task_to_update = Task.query.get(task_id)
-    if not task_to_update:
-        return jsonify({"error": "Task not found"}), 404
-
     # Add security check here to ensure user can edit this task
 
-    data = request.json
-    task_to_update.title = data.get('title', task_to_update.title)
-    task_to_update.description = data.get('description', task_to_update.description)
-    task_to_update.status = data.get('status', task_to_update.status)
-    task_to_update.priority = data.get('priority', task_to_update.priority)
-    task_to_update.due_date = data.get('due_date', task_to_update.due_date)
-    task_to_update.assignee_id = data.get('assignee_id', task_to_update.assignee_id)
+    data = request.json or {}
+    changes = {field: data[field] for field in TASK_UPDATABLE_FIELDS if field in data}
 
     try:
+        # The UPDATE returns the row it wrote, so nothing is loaded before it or re-read after it;
+        # with nothing to change it is a plain read of the same columns.
+        if changes:
+            stmt = update(Task).where(Task.id == task_id).values(**changes).returning(*_TASK_RESPONSE_COLUMNS)
+        else:
+            stmt = select(*_TASK_RESPONSE_COLUMNS).where(Task.id == task_id)
+        task_row = db.session.execute(stmt).first()
+        if task_row is None:
+            return jsonify({"error": "Task not found"}), 404
+        assignee_name = db.session.scalar(select(User.name).where(User.id == task_row.assignee_id)) \
+            if task_row.assignee_id else None
         db.session.commit()
-        # Re-fetch with join to get assignee name for response
-        response_data = db.session.query(Task, User.name.label('assignee_name'))\
-            .outerjoin(User, Task.assignee_id == User.id)\
-            .filter(Task.id == task_id).first()
 
-        task_obj, assignee_name = response_data
-        return jsonify({
-            'id': task_obj.id, 'title': task_obj.title, 'description': task_obj.description,
-            'status': task_obj.status, 'is_completed': task_obj.status == 'Done',
-            'priority': task_obj.priority, 'due_date': task_obj.due_date,
-            'assignee_id': task_obj.assignee_id, 'assignee_name': assignee_name
-        })
+        return jsonify({**task_row._mapping, 'is_completed': task_row.status == 'Done', 'assignee_name': assignee_name})
     except Exception as e:
         db.session.rollback()
         print(f"Error updating task: {e}")
@@ -283,14 +253,13 @@ def update_task_api_v2(task_id): # Renamed function
 def delete_task_api_v2(task_id): # Renamed function
     if 'current_user' not in session: return jsonify({"error": "Unauthorized"}), 401
 
-    task_to_delete = Task.query.get(task_id)
-    if not task_to_delete:
-        return jsonify({"error": "Task not found"}), 404
-
     # Add security check here
 
     try:
-        db.session.delete(task_to_delete)
+        # One DELETE; RETURNING tells a missing task apart without loading it first
+        deleted_id = db.session.execute(delete(Task).where(Task.id == task_id).returning(Task.id)).scalar()
+        if deleted_id is None:
+            return jsonify({"error": "Task not found"}), 404
         db.session.commit()
         return jsonify({"message": "Task deleted successfully"}), 200
     except Exception as e:
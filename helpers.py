@@ -0,0 +1,66 @@
+"""Helpers shared by app.py and the older app copies.
+
+The lookups need an application context, like any other use of db.session;
+conditional_response() needs the request it answers.
+"""
+import secrets
+import time
+
+from flask import request
+from sqlalchemy import select, bindparam
+
+from models import db, User, Project
+
+# The user directory (the assignee dropdown and the user list) only changes when a
+# user is added or deleted, so each process keeps it for USER_DIRECTORY_TTL seconds;
+# callers that delete a user drop this process's copy at once.
+USER_DIRECTORY_TTL = 60
+_user_directory = {'rows': None, 'expires_at': 0.0}
+
+_USER_DIRECTORY_STMT = select(User.id, User.name, User.role).order_by(User.name)
+
+def get_user_directory():
+    """Returns {id, name, role} for every user, ordered by name."""
+    if _user_directory['rows'] is None or time.monotonic() >= _user_directory['expires_at']:
+        _user_directory['rows'] = [dict(row._mapping) for row in db.session.execute(_USER_DIRECTORY_STMT)]
+        _user_directory['expires_at'] = time.monotonic() + USER_DIRECTORY_TTL
+    return _user_directory['rows']
+
+def invalidate_user_directory():
+    _user_directory['rows'] = None
+
+# Project names and descriptions practically never change, so found projects are kept per
+# process for PROJECT_CACHE_TTL seconds. Misses are not cached, so unknown ids cannot fill it.
+PROJECT_CACHE_TTL = 300
+_project_cache = {}
+
+_PROJECT_STMT = select(Project.id, Project.name, Project.description).where(Project.id == bindparam('project_id'))
+
+def get_project(project_id):
+    """Returns {id, name, description} for the project, or None if it doesn't exist."""
+    cached = _project_cache.get(project_id)
+    if cached and time.monotonic() < cached[1]:
+        return cached[0]
+    row = db.session.execute(_PROJECT_STMT, {'project_id': project_id}).first()
+    if row is None:
+        return None
+    project = dict(row._mapping)
+    _project_cache[project_id] = (project, time.monotonic() + PROJECT_CACHE_TTL)
+    return project
+
+def conditional_response(response):
+    """Tags a list response with an ETag of its body and answers 304 when the client already has it."""
+    response.add_etag()
+    # Per-user data: browsers may keep it but must revalidate, and shared caches must not serve it across cookies
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+def make_dummy_password_hash(bcrypt):
+    """Returns the hash of a random password nobody knows, at the same cost as the app's real hashes.
+
+    Logins for unknown emails are checked against it so they take as long as a wrong
+    password and don't reveal which accounts exist.
+    """
+    return bcrypt.generate_password_hash(secrets.token_urlsafe(16)).decode('utf-8')
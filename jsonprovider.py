@@ -0,0 +1,19 @@
+"""Flask JSON provider shared by app.py and the older app copies."""
+from flask.json.provider import DefaultJSONProvider
+import orjson
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Serializes jsonify() responses with orjson, which also encodes datetimes natively."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's UTF-8 bytes straight to the response rather than
+        # decoding them to str for Werkzeug to encode again.
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
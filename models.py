@@ -0,0 +1,122 @@
+"""SQLAlchemy models shared by app.py, the older app copies and setup_database.py.
+
+Each app creates its own Flask instance and binds it with db.init_app(app), so
+the tables are declared once and every entry point creates the same schema.
+"""
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import sqlite
+
+# Instances stay loaded after commit(); handlers read ids and values of rows they
+# just wrote, and expiring them would cost a SELECT per attribute access.
+db = SQLAlchemy(session_options={'expire_on_commit': False})
+
+# SQLite stores CURRENT_TIMESTAMP as 'YYYY-MM-DD HH:MM:SS' but writes bound datetimes
+# with microseconds, and compares the two as strings. Binding whole seconds there keeps
+# a created_at cursor equal to the row it came from.
+Timestamp = db.TIMESTAMP().with_variant(sqlite.DATETIME(truncate_microseconds=True), 'sqlite')
+
+# --- Database Models ---
+class User(db.Model):
+    __tablename__ = 'users'
+    id = db.Column(db.Text, primary_key=True)
+    email = db.Column(db.Text, unique=True, nullable=False)
+    name = db.Column(db.Text, nullable=False)
+    password_hash = db.Column(db.Text, nullable=False)
+    role = db.Column(db.Text, nullable=False)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    # Login matches emails case-insensitively; this serves that lookup and keeps
+    # 'Bob@x' and 'bob@x' from becoming two accounts.
+    __table_args__ = (db.Index('ix_users_email_lower', db.func.lower(email), unique=True),)
+    # The collections below are never loaded implicitly. passive_deletes leaves
+    # the ON DELETE rules to Postgres instead of loading every row to null it out.
+    assigned_tasks = db.relationship('Task', foreign_keys='Task.assignee_id', back_populates='assignee',
+                                     lazy='raise', passive_deletes=True)
+    created_tasks = db.relationship('Task', foreign_keys='Task.creator_id', back_populates='creator',
+                                    lazy='raise', passive_deletes=True)
+    comments = db.relationship('Comment', back_populates='user', lazy='raise', passive_deletes=True)
+    messages = db.relationship('Message', back_populates='user', lazy='raise', passive_deletes=True)
+
+    # Fields that are safe to send to clients; password_hash is deliberately excluded.
+    SAFE_FIELDS = ('id', 'email', 'name', 'role', 'created_at')
+
+    def to_public_dict(self):
+        return {field: getattr(self, field) for field in User.SAFE_FIELDS}
+
+class Project(db.Model):
+    __tablename__ = 'projects'
+    id = db.Column(db.Text, primary_key=True)
+    name = db.Column(db.Text, nullable=False)
+    description = db.Column(db.Text)
+    owner_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='RESTRICT'), nullable=False)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, server_default=db.func.now(), onupdate=db.func.now())
+    tasks = db.relationship('Task', back_populates='project', lazy='raise', passive_deletes=True)
+
+class ProjectMember(db.Model):
+    __tablename__ = 'project_members'
+    project_id = db.Column(db.Text, db.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    # The composite primary key already serves project_id lookups; this covers "projects for a user".
+    __table_args__ = (db.Index('ix_project_members_user', user_id),)
+
+class Task(db.Model):
+    __tablename__ = 'tasks'
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Text, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
+    title = db.Column(db.Text, nullable=False)
+    description = db.Column(db.Text)
+    status = db.Column(db.Text, nullable=False, default='To Do')
+    priority = db.Column(db.Text, nullable=False, default='Medium')
+    due_date = db.Column(db.Text)
+    creator_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'))
+    assignee_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'))
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, server_default=db.func.now(), onupdate=db.func.now())
+    # lazy='raise' turns an accidental per-row lookup into an error instead of
+    # a silent N+1; load these with a join or selectinload().
+    project = db.relationship('Project', back_populates='tasks', lazy='raise')
+    assignee = db.relationship('User', foreign_keys=[assignee_id], back_populates='assigned_tasks', lazy='raise')
+    creator = db.relationship('User', foreign_keys=[creator_id], back_populates='created_tasks', lazy='raise')
+    comments = db.relationship('Comment', back_populates='task', lazy='raise', passive_deletes=True)
+    # ix_tasks_assignee lets ON DELETE SET NULL find a deleted user's tasks without scanning the table
+    __table_args__ = (db.Index('ix_tasks_project_created', project_id, created_at.desc(), id.desc()),
+                      db.Index('ix_tasks_assignee', assignee_id))
+
+class Comment(db.Model):
+    __tablename__ = 'comments'
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=False)
+    comment_text = db.Column(db.Text, nullable=False)
+    is_alert = db.Column(db.Integer, nullable=False, default=0)
+    media_attachments = db.Column(db.Text)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    task = db.relationship('Task', back_populates='comments', lazy='raise')
+    user = db.relationship('User', back_populates='comments', lazy='raise')
+    __table_args__ = (db.Index('ix_comments_task_created', task_id, created_at),)
+
+class Message(db.Model):
+    __tablename__ = 'messages'
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Text, nullable=False)
+    user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=False)
+    message_text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    user = db.relationship('User', back_populates='messages', lazy='raise')
+    __table_args__ = (db.Index('ix_messages_conversation_created', conversation_id, created_at, id),)
+
+class Invitation(db.Model):
+    __tablename__ = 'invitations'
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.Text, unique=True, nullable=False)
+    email = db.Column(db.Text, nullable=False)
+    project_id = db.Column(db.Text, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
+    role = db.Column(db.Text, nullable=False)
+    status = db.Column(db.Text, nullable=False, default='pending') # pending, accepted
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    accepted_at = db.Column(Timestamp)
+    accepted_by_user_id = db.Column(db.Text, db.ForeignKey('users.id', ondelete='SET NULL'))
+    # At most one pending invitation per email; accepted ones are left out of the index entirely
+    __table_args__ = (db.Index('ix_invitations_email_pending', email, unique=True,
+                               postgresql_where=db.text("status = 'pending'"),
+                               sqlite_where=db.text("status = 'pending'")),)
@@ -77,4 +77,16 @@ CREATE TABLE messages (
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
     FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE SET NULL
-);
\ No newline at end of file
+);
+
+-- Indexes declared in models.py, under the same names. ix_users_email_lower
+-- serves the case-insensitive login lookup and keeps emails unique regardless of
+-- case. The list indexes filter on their parent id and order by created_at, so
+-- they serve both the WHERE and the ORDER BY without a sort.
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email_lower ON users (lower(email));
+CREATE INDEX IF NOT EXISTS ix_tasks_project_created ON tasks (project_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_tasks_assignee ON tasks (assignee_id);
+CREATE INDEX IF NOT EXISTS ix_comments_task_created ON comments (task_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_messages_conversation_created ON messages (conversation_id, created_at, id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_invitations_email_pending ON invitations (email) WHERE status = 'pending';
@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.fixture(scope='session')
+def taskgenius(tmp_path_factory):
+    """Imports app.py against a throwaway SQLite database seeded by init-db."""
+    # app.py reads its configuration at import time; the environment is restored
+    # once the session ends so nothing else in the process sees these values.
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path_factory.mktemp('db') / 'taskgenius.db'}")
+        monkeypatch.delenv('REDIS_URL', raising=False)
+        import app as taskgenius
+        taskgenius.app.testing = True
+        result = taskgenius.app.test_cli_runner().invoke(args=['init-db'])
+        assert result.exception is None, result.output
+        yield taskgenius
@@ -0,0 +1,44 @@
+"""Invitation endpoint: only a duplicate pending invitation is reported as a conflict."""
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+
+@pytest.fixture
+def owner_client(taskgenius):
+    client = taskgenius.app.test_client()
+    response = client.post('/api/v1/login', json={'email': 'owner@workbuddy.pro', 'password': 'password123'})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+def test_unknown_project_is_not_found(owner_client):
+    response = owner_client.post('/api/v1/projects/nope/invitations', json={'email': 'new@example.com', 'role': 'Worker'})
+    assert response.status_code == 404
+
+
+def test_pending_invitation_conflicts(owner_client):
+    invite = {'email': 'twice@example.com', 'role': 'Worker'}
+    assert owner_client.post('/api/v1/projects/proj_alpha/invitations', json=invite).status_code == 201
+    response = owner_client.post('/api/v1/projects/proj_alpha/invitations', json=invite)
+    assert response.status_code == 409
+    assert response.get_json() == {"error": "An invitation for this email is already pending."}
+
+
+def _insert_error(taskgenius, **fields):
+    with taskgenius.app.app_context():
+        db = taskgenius.db
+        db.session.add(taskgenius.Invitation(project_id='proj_alpha', role='Worker', **fields))
+        with pytest.raises(IntegrityError) as excinfo:
+            db.session.commit()
+        db.session.rollback()
+    return excinfo.value
+
+
+def test_unique_violation_names_only_its_own_index(taskgenius):
+    with taskgenius.app.app_context():
+        db = taskgenius.db
+        db.session.add(taskgenius.Invitation(token='tok-1', email='held@example.com', project_id='proj_alpha', role='Worker'))
+        db.session.commit()
+    index = taskgenius._PENDING_INVITATION_INDEX
+    assert taskgenius.is_unique_violation(_insert_error(taskgenius, token='tok-2', email='held@example.com'), index)
+    assert not taskgenius.is_unique_violation(_insert_error(taskgenius, token='tok-1', email='other@example.com'), index)
@@ -0,0 +1,67 @@
+"""Checks that each list endpoint stays within its QUERY_BUDGETS entry.
+
+Runs app.py against a throwaway SQLite database with a few rows in every list,
+so a per-row lookup (an N+1) pushes the count over budget.
+"""
+import pytest
+from sqlalchemy import event
+
+# (endpoint, url) for every endpoint with a budget
+LIST_REQUESTS = [
+    ('get_projects_api', '/api/v1/projects'),
+    ('get_project_members_api', '/api/v1/projects/proj_alpha/members'),
+    ('get_tasks_api', '/api/v1/projects/proj_alpha/tasks'),
+    ('get_task_detail_api', '/api/v1/tasks/1'),
+    ('get_comments_api', '/api/v1/tasks/1/comments'),
+    ('get_chat_messages', '/api/v1/chat/general/messages'),
+]
+
+
+@pytest.fixture(scope='module')
+def client(taskgenius):
+    with taskgenius.app.app_context():
+        db = taskgenius.db
+        db.session.add(taskgenius.Project(id='proj_beta', name='Project Beta', owner_id='owner01'))
+        db.session.add(taskgenius.ProjectMember(project_id='proj_beta', user_id='owner01'))
+        db.session.commit()
+    client = taskgenius.app.test_client()
+    response = client.post('/api/v1/login', json={'email': 'owner@workbuddy.pro', 'password': 'password123'})
+    assert response.status_code == 200, response.get_json()
+    for i, assignee_id in enumerate(['owner01', 'foremanA', 'workerX']):
+        response = client.post('/api/v1/projects/proj_alpha/tasks', json={'title': f'Task {i}', 'assignee_id': assignee_id})
+        assert response.status_code == 201, response.get_json()
+    for i in range(3):
+        response = client.post('/api/v1/tasks/1/comments', json={'comment_text': f'Comment {i}'})
+        assert response.status_code == 201, response.get_json()
+        response = client.post('/api/v1/chat/general/messages', json={'message_text': f'Message {i}'})
+        assert response.status_code == 201, response.get_json()
+    return client
+
+
+@pytest.fixture
+def count_queries(taskgenius):
+    """Yields a list that collects every statement the engine executes."""
+    with taskgenius.app.app_context():
+        engine = taskgenius.db.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_every_budget_is_checked(taskgenius):
+    assert {endpoint for endpoint, _ in LIST_REQUESTS} == set(taskgenius.QUERY_BUDGETS)
+
+
+@pytest.mark.parametrize('endpoint,url', LIST_REQUESTS)
+def test_list_endpoint_within_query_budget(taskgenius, client, count_queries, endpoint, url):
+    # Budgets include the user lookup in authenticate_request, so start from a cold cache
+    taskgenius.get_cached_user.cache_clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert len(response.get_json()) > 1
+    assert len(count_queries) <= taskgenius.QUERY_BUDGETS[endpoint], count_queries